@@ -15,14 +15,13 @@ limitations under the License.
 """
 
 import logging
+import math
 import time
 import asyncio
-from datetime import datetime
 import pytz
 import numpy as np
 import pandas as pd
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient, Point, WritePrecision, WriteOptions
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
@@ -31,6 +30,11 @@ class DBClient:
     Manages interactions with an InfluxDB database, including storing and retrieving
     sensor data, managing time series, and handling predictions.
 
+    The store methods only enqueue the records: the batching write API sends them
+    from its own background thread, so they never block the asyncio event loop and
+    can be called directly from the CoAP handlers. Queries are blocking and must be
+    run outside the event loop (e.g. with `asyncio.to_thread`).
+
     Attributes
     ----------
     tz : pytz.timezone
@@ -38,6 +42,12 @@ class DBClient:
 
     Methods
     -------
+    get_shared(db_token, db_org, db_url, db_bucket)
+        Return the process-wide client for the given database.
+    close()
+        Flush pending writes and close the connection to the database.
+    close_shared()
+        Close all the process-wide clients.
     store_value(measurement, field, sensor_id, value)
         Store a single value in the InfluxDB database.
     store_ldr_influxdb(ldr_value, sensor_id)
@@ -46,12 +56,14 @@ class DBClient:
         Store mean latency values in the database.
     load_timeseries(time_window, sensor_id)
         Retrieve a time series of sensor data from the database.
-    store_predictions(predictions_df, sensor_id)
-        Store predicted values in the database.
+    store_prediction_bundle(predictions_df, sensor_id)
+        Store predicted values and their bounds in a single write.
     """
     
     tz = pytz.timezone("Europe/Rome")
 
+    _instances: dict[tuple[str, str, str], "DBClient"] = {}
+
     def __init__(self, db_token: str, db_org: str, db_url: str, db_bucket: str):
         """
         Initialize the InfluxDB client with configuration settings.
@@ -78,6 +90,87 @@ class DBClient:
             "bucket": db_bucket
         }
 
+        # Line-protocol prefixes "<measurement>,sensor=<id> <field>=" keyed by (measurement, sensor_id, field)
+        self._prefix_cache: dict[tuple[str, str, str], bytes] = {}
+
+        # Long-lived client: points are queued and flushed in batches by the write API
+        self._client = InfluxDBClient(url=db_url, token=db_token, org=db_org)
+        self._write_api = self._client.write_api(write_options=WriteOptions(batch_size=100,
+                                                                            flush_interval=1000,
+                                                                            jitter_interval=200))
+
+    @classmethod
+    def get_shared(cls, db_token: str, db_org: str, db_url: str, db_bucket: str) -> "DBClient":
+        """
+        Return the client shared by the whole process for the given database,
+        creating it on first use.
+
+        Parameters
+        ----------
+        db_token : str
+            Authentication token for the InfluxDB instance.
+        db_org : str
+            Organization name for the InfluxDB instance.
+        db_url : str
+            URL of the InfluxDB instance.
+        db_bucket : str
+            Bucket (database) name where data will be stored.
+
+        Returns
+        -------
+        DBClient
+            The cached client for (`db_url`, `db_org`, `db_bucket`).
+        """
+        key = (db_url, db_org, db_bucket)
+        if key not in cls._instances:
+            cls._instances[key] = cls(db_token, db_org, db_url, db_bucket)
+        return cls._instances[key]
+
+    def close(self) -> None:
+        """
+        Flush the pending points and close the connection to the InfluxDB instance.
+        """
+        self._write_api.close()
+        self._client.close()
+
+    @classmethod
+    def close_shared(cls) -> None:
+        """
+        Close every client returned by `get_shared`, flushing their pending points.
+        Safe to call more than once.
+        """
+        while cls._instances:
+            _, client = cls._instances.popitem()
+            client.close()
+
+    def _line_prefix(self, measurement: str, sensor_id: str, field: str) -> bytes:
+        """
+        Return the cached line-protocol prefix for a measurement/sensor/field triple.
+
+        Parameters
+        ----------
+        measurement : str
+            Name of the measurement.
+        sensor_id : str
+            Identifier for the sensor.
+        field : str
+            Field name under which the value is stored.
+
+        Returns
+        -------
+        bytes
+            The escaped `<measurement>,sensor=<sensor_id> <field>=` prefix.
+        """
+        key = (measurement, sensor_id, field)
+        prefix = self._prefix_cache.get(key)
+        if prefix is None:
+            # Line-protocol escaping: commas and spaces everywhere, equal signs in keys and tag values
+            m = measurement.replace(",", r"\,").replace(" ", r"\ ")
+            s, f = (str(k).replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ") for k in (sensor_id, field))
+            prefix = f"{m},sensor={s} {f}=".encode()
+            self._prefix_cache[key] = prefix
+        return prefix
+
     def store_value(self, measurement: str, field: str, sensor_id: str, value: float) -> None:
         """
         Store a single measurement value in the InfluxDB database.
@@ -93,17 +186,21 @@ class DBClient:
         value : float
             The value to store.
         """
-        self.logger.debug(f"Storing value from {sensor_id} in {measurement}: {value}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-
-        # Create a point with the given data
-        p = Point(measurement).tag("sensor", sensor_id).field(field, float(value)).time(datetime.now(tz=self.tz), WritePrecision.S)
-        self.logger.debug(f"Point: {p}")
-        
+        self.logger.debug("Storing %s.%s from %s: %s", measurement, field, sensor_id, value)
+
+        # NaN and infinities are not valid in line protocol and would get the whole batch rejected
+        if not math.isfinite(value):
+            self.logger.warning("Skipping non-finite %s.%s from %s: %s", measurement, field, sensor_id, value)
+            return
+
+        # Build the line-protocol record directly, the write API batches the lines
+        # repr gives the shortest string that round-trips the float, without %.17g's noise digits
+        line = self._line_prefix(measurement, sensor_id, field) + b"%s %d" % (repr(float(value)).encode(), time.time_ns())
+        self.logger.debug("Line: %r", line)
+
         # Write the point to the database
-        write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        client.close()
+        self._write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=line,
+                              write_precision=WritePrecision.NS)
 
     def store_ldr_influxdb(self, ldr_value: float, sensor_id: str) -> None:
         """
@@ -116,14 +213,10 @@ class DBClient:
         sensor_id : str
             Identifier for the sensor.
         """
-        self.logger.debug(f"Storing values sensed from LDR{sensor_id}: {ldr_value}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
+        self.logger.debug("Storing values sensed from LDR%s: %s", sensor_id, ldr_value)
 
         # Store LDR value as a "ldrValue" measurement
-        p = Point("ldrValue").tag("sensor", sensor_id).field("ldr", float(ldr_value)).time(datetime.now(tz=self.tz), WritePrecision.S)
-        write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        client.close()
+        self.store_value("ldrValue", "ldr", sensor_id, ldr_value)
 
     def store_mean_lat_influxdb(self, mean_lat: float, sensor_id: str) -> None:
         """
@@ -136,14 +229,10 @@ class DBClient:
         sensor_id : str
             Identifier for the sensor.
         """
-        self.logger.debug(f"Storing mean latency for LDR{sensor_id}: {mean_lat}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
+        self.logger.debug("Storing mean latency for LDR%s: %s", sensor_id, mean_lat)
 
         # Store the mean latency value as a "meanLat" measurement
-        p = Point("meanLat").tag("sensor", sensor_id).field("mean_lat", float(mean_lat)).time(datetime.now(tz=self.tz), WritePrecision.S)
-        write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        client.close()
+        self.store_value("meanLat", "mean_lat", sensor_id, mean_lat)
 
     def load_timeseries(self, time_window: str, sensor_id: str) -> pd.DataFrame:
         """
@@ -162,8 +251,6 @@ class DBClient:
             A DataFrame containing the time series data with columns `ds` (timestamps)
             and `y` (values). If insufficient data is available, returns an empty DataFrame.
         """
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-
         # Query InfluxDB for the specified time window and sensor
         query = f'''
             from(bucket: "{self.db_cfg['bucket']}")
@@ -173,97 +260,51 @@ class DBClient:
                     r._field == "ldr" and
                     r.sensor == "{sensor_id}"
                 )
+                |> keep(columns: ["_time", "_value"])
             '''
-        query_api = client.query_api()
-        result = query_api.query(query)
-
-        # Parse results into a DataFrame
-        data = {'ds': [], 'y': []}
-        for table in result:
-            for record in table.records:
-                data['ds'].append(record.get_time())
-                data['y'].append(record.get_value())
-
-        df = pd.DataFrame(data)
-        df['ds'] = pd.to_datetime(df['ds']).dt.tz_convert('Europe/Rome').dt.tz_localize(None)
+        # Let the client build the DataFrame from the CSV response instead of per-record objects
+        df = self._client.query_api().query_data_frame(query)
+        if isinstance(df, list):
+            df = pd.concat(df, ignore_index=True)
+        df = df.reindex(columns=['_time', '_value']).rename(columns={'_time': 'ds', '_value': 'y'})
+        if not df.empty:
+            df['ds'] = pd.to_datetime(df['ds']).dt.tz_convert('Europe/Rome').dt.tz_localize(None)
 
         # Validate if data is sufficient
-        if df.dropna().shape[0] < 2:
+        if df.notna().all(axis=1).sum() < 2:
             df = pd.DataFrame(columns=['ds', 'y'])
         else:
             self.logger.debug("Sufficient data found. Proceeding to analysis")
-        
-        client.close()
-        return df
 
-    def store_predictions(self, predictions_df: pd.DataFrame, sensor_id: str) -> None:
-        """
-        Store predicted values in the InfluxDB database.
+        return df
 
-        Parameters
-        ----------
-        predictions_df : pd.DataFrame
-            DataFrame containing predicted values with columns `ds` (timestamps)
-            and `yhat` (predicted values).
-        sensor_id : str
-            Identifier for the sensor.
-        """
-        self.logger.debug(f"Storing predicted values for LDR{sensor_id}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-
-        # Write predictions row by row to the database
-        for _, row in predictions_df.iterrows():
-            timestamp = pd.to_datetime(row['ds']).tz_localize('Europe/Rome')
-            p = Point("ldrValue").tag("sensor", sensor_id).field("pred", float(row['yhat'])).time(timestamp, WritePrecision.S)
-            write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        
-        client.close()
-
-    def store_predictions_upper(self, predictions_df: pd.DataFrame, sensor_id: str) -> None:
+    def store_prediction_bundle(self, predictions_df: pd.DataFrame, sensor_id: str) -> None:
         """
-        Store predicted values in the InfluxDB database.
+        Store predicted values together with their lower and upper bounds in a single write.
 
-        Parameters
-        ----------
-        predictions_df : pd.DataFrame
-            DataFrame containing predicted values with columns `ds` (timestamps)
-            and `yhat` (predicted values).
-        sensor_id : str
-            Identifier for the sensor.
-        """
-        self.logger.debug(f"Storing predicted values for LDR{sensor_id}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-
-        # Write predictions row by row to the database
-        for _, row in predictions_df.iterrows():
-            timestamp = pd.to_datetime(row['ds']).tz_localize('Europe/Rome')
-            p = Point("ldrValue").tag("sensor", sensor_id).field("pred_upper", float(row['yhat_upper'])).time(timestamp, WritePrecision.S)
-            write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        
-        client.close()
-
-    def store_predictions_lower(self, predictions_df: pd.DataFrame, sensor_id: str) -> None:
-        """
-        Store predicted values in the InfluxDB database.
+        Each row becomes one point of the `ldrValue` measurement carrying the `pred`,
+        `pred_lower` and `pred_upper` fields.
 
         Parameters
         ----------
         predictions_df : pd.DataFrame
-            DataFrame containing predicted values with columns `ds` (timestamps)
-            and `yhat` (predicted values).
+            DataFrame containing predicted values with columns `ds` (timestamps),
+            `yhat`, `yhat_lower` and `yhat_upper`.
         sensor_id : str
             Identifier for the sensor.
         """
-        self.logger.debug(f"Storing predicted values for LDR{sensor_id}")
-        client = InfluxDBClient(url=self.db_cfg['url'], token=self.db_cfg['token'], org=self.db_cfg['org'])
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-
-        # Write predictions row by row to the database
-        for _, row in predictions_df.iterrows():
-            timestamp = pd.to_datetime(row['ds']).tz_localize('Europe/Rome')
-            p = Point("ldrValue").tag("sensor", sensor_id).field("pred_lower", float(row['yhat_lower'])).time(timestamp, WritePrecision.S)
-            write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=p)
-        
-        client.close()
\ No newline at end of file
+        self.logger.debug("Storing predicted values and bounds for LDR%s", sensor_id)
+
+        timestamps = pd.DatetimeIndex(predictions_df['ds']).tz_localize('Europe/Rome')
+        points = [
+            Point("ldrValue").tag("sensor", sensor_id)
+                             .field("pred", float(yhat))
+                             .field("pred_lower", float(yhat_lower))
+                             .field("pred_upper", float(yhat_upper))
+                             .time(timestamp, WritePrecision.S)
+            for timestamp, yhat, yhat_lower, yhat_upper in zip(timestamps,
+                                                             predictions_df['yhat'].to_numpy(),
+                                                             predictions_df['yhat_lower'].to_numpy(),
+                                                             predictions_df['yhat_upper'].to_numpy())
+        ]
+        self._write_api.write(bucket=self.db_cfg['bucket'], org=self.db_cfg['org'], record=points)
@@ -0,0 +1,103 @@
+"""
+Copyright 2024 Lorenzo Grandi
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
+
+# Numba is optional: without it the kernels fall back to NumPy and pandas implementations
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+
+def _rolling_outlier_mask_loop(ts_ns: np.ndarray, y: np.ndarray, window_ns: int, k: float) -> np.ndarray:
+    """
+    Single O(N) pass over the series, keeping a running sum and sum of squares of the window.
+    """
+    n = y.shape[0]
+    keep = np.ones(n, dtype=np.bool_)
+    head = 0
+    s = np.float64(0.0)
+    s2 = np.float64(0.0)
+    for i in range(n):
+        s += y[i]
+        s2 += y[i] * y[i]
+        # Slide the window start past the points that are too old
+        while ts_ns[head] <= ts_ns[i] - window_ns:
+            s -= y[head]
+            s2 -= y[head] * y[head]
+            head += 1
+        count = i - head + 1
+        if count >= 2:
+            mean = s / count
+            var = max((s2 - s * mean) / (count - 1), 0.0)
+            if abs(y[i] - mean) > k * np.sqrt(var):
+                keep[i] = False
+    return keep
+
+def _rolling_outlier_mask_pandas(ts_ns: np.ndarray, y: np.ndarray, window_ns: int, k: float) -> np.ndarray:
+    """
+    Same mask computed with pandas' rolling window aggregations, which run in C.
+    """
+    series = pd.Series(y, index=pd.DatetimeIndex(ts_ns.view('datetime64[ns]')), dtype=np.float64)
+    rolling = series.rolling(pd.Timedelta(window_ns, unit='ns'))
+    mean = rolling.mean().to_numpy()
+    std = rolling.std().to_numpy()
+    # Where the window holds a single value the std is NaN and the comparison is False
+    return ~(np.abs(series.to_numpy() - mean) > k * std)
+
+# The loop is only worth running when numba compiles it, otherwise pandas does the work
+_rolling_outlier_mask_impl = njit(cache=True)(_rolling_outlier_mask_loop) if HAVE_NUMBA else _rolling_outlier_mask_pandas
+
+def rolling_outlier_mask(ts_ns: np.ndarray, y: np.ndarray, window_ns: int, k: float) -> np.ndarray:
+    """
+    Flags the points that lie within `k` rolling standard deviations of the rolling mean.
+
+    The rolling window is time based, like pandas' `rolling("1h")`: point `i` is compared
+    with the points whose timestamp is in `(ts_ns[i] - window_ns, ts_ns[i]]`.
+
+    Parameters
+    ----------
+    ts_ns : np.ndarray
+        Sorted timestamps in nanoseconds (int64).
+    y : np.ndarray
+        Values of the series (float32 or float64). Sums are accumulated in double precision.
+    window_ns : int
+        Length of the rolling window in nanoseconds.
+    k : float
+        Number of standard deviations beyond which a point is an outlier.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, True for the points to keep. Points whose window holds fewer
+        than two values have no standard deviation and are kept.
+    """
+    return _rolling_outlier_mask_impl(ts_ns, y, window_ns, k)
+
+def warm_up() -> None:
+    """
+    Compile (or load from the cache) the JIT kernels for the dtypes in use.
+
+    Meant to run once in the worker processes that call the kernels, so that the
+    compilation is not paid on their first real call nor in processes that never use them.
+    """
+    for dtype in (np.float32, np.float64):
+        rolling_outlier_mask(np.zeros(2, dtype=np.int64), np.zeros(2, dtype=dtype), 1, 1.0)
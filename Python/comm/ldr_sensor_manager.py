@@ -15,11 +15,12 @@ limitations under the License.
 """
 
 import datetime
+import time
 import logging
-import numpy as np
 import aiocoap
 import aiocoap.resource as resource
 from aiocoap import Message
+from aiocoap.numbers import ContentFormat
 import asyncio
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
@@ -29,6 +30,58 @@ from sensorInfo.position import Position
 from comm.mqtt_client import MqttClient
 from comm.db_client import DBClient
 
+
+def parse_payload(buf: bytes) -> tuple[bytes, bytes, int]:
+    """
+    Parses a CoAP payload of the form `sensor_id=<id>&location=<location>&data=<value>`
+    in a single pass over the raw bytes. The fields must come in this order, as sent
+    by the sensor firmware.
+
+    Parameters
+    ----------
+    buf : bytes
+        Raw payload of the CoAP request.
+
+    Returns
+    -------
+    tuple[bytes, bytes, int]
+        Sensor ID, location and LDR value carried by the payload.
+    """
+    _, _, rest = buf.partition(b"sensor_id=")
+    sensor_id, _, rest = rest.partition(b"&location=")
+    location, _, data = rest.partition(b"&data=")
+    return sensor_id, location, int(data)
+
+
+# Size of a binary payload: sensor_id(4) | location(4) | value(2)
+BINARY_PAYLOAD_LEN = 10
+
+def parse_binary_payload(buf: bytes) -> tuple[bytes, bytes, int]:
+    """
+    Parses a binary CoAP payload laid out as `sensor_id(4) | location(4) | value(2)`,
+    where the first two fields are NUL-padded ASCII and the value is a little-endian
+    unsigned 16-bit integer.
+
+    Parameters
+    ----------
+    buf : bytes
+        Raw payload of the CoAP request.
+
+    Returns
+    -------
+    tuple[bytes, bytes, int]
+        Sensor ID, location and LDR value carried by the payload.
+
+    Raises
+    ------
+    ValueError
+        If the payload is not exactly 10 bytes long.
+    """
+    if len(buf) != BINARY_PAYLOAD_LEN:
+        raise ValueError(f"binary payload must be {BINARY_PAYLOAD_LEN} bytes, got {len(buf)}")
+    return buf[:4].rstrip(b"\0"), buf[4:8].rstrip(b"\0"), int.from_bytes(buf[8:10], "little")
+
+
 class LdrSensorManager(resource.Resource):
     """
     A manager class for Light-Dependent Resistor (LDR) sensors. Handles CoAP communication,
@@ -52,14 +105,15 @@ class LdrSensorManager(resource.Resource):
         Current sampling period for CoAP communication (in seconds).
     ns_sampling_period : int
         Updated sampling period, applied dynamically if changed.
-    ldr_timeseries : np.array
-        Stores the time-series data for LDR values.
+    accum_window_len : int
+        Length (in minutes) of the window over which the receive latency is averaged.
     coap_ldr_value : int
         Latest LDR value received via CoAP communication.
     """
 
     def __init__(self, coap_cfg: dict[str, None], mqtt_cfg: dict[str, None], influxdb_cfg: dict[str, str],
-                 sensor_id: str, position: Position, plant: Plant, sampling_period: int) -> None:
+                 sensor_id: str, position: Position, plant: Plant, sampling_period: int,
+                 accum_window_len: int) -> None:
         """
         Initializes the LDR Sensor Manager.
 
@@ -79,6 +133,8 @@ class LdrSensorManager(resource.Resource):
             Information about the associated plant.
         sampling_period : int
             Sampling period in seconds for CoAP communication.
+        accum_window_len : int
+            Length of the latency accumulation window in minutes.
         """
         super().__init__()
         self.logger = logging.getLogger("CoAP")
@@ -88,24 +144,27 @@ class LdrSensorManager(resource.Resource):
 
         self.LDR_start_timeseries = datetime.datetime.now()
         self.coap_cfg = coap_cfg
+        # Plant and position are immutable: bind copies to this sensor
+        self.plant = plant.update_plant(sensor_id=sensor_id)
+        self.position = position.update(sensor_id=sensor_id)
         self.mqtt_client = MqttClient(mqtt_cfg['ip'], mqtt_cfg['port'], mqtt_cfg['user'], mqtt_cfg['password'],
-                                      sensor_id, position, sampling_period)
-        self.influxdb_client = DBClient(influxdb_cfg['token'], influxdb_cfg['org'], influxdb_cfg['url'], influxdb_cfg['bucket'])
+                                      sensor_id, self.position, sampling_period)
+        self.influxdb_client = DBClient.get_shared(influxdb_cfg['token'], influxdb_cfg['org'], influxdb_cfg['url'], influxdb_cfg['bucket'])
         self.sensor_id = sensor_id
-        self.plant = plant
-        self.plant.sensor_id = sensor_id
-        self.position = position
-        self.position.sensor_id = sensor_id
         self.cs_sampling_period = sampling_period
         self.ns_sampling_period = sampling_period
         self.coap_ldr_value = 0
-        self.ldr_timeseries = np.array([], dtype=int)
+
+        # Receive latency accumulator: running sum (in nanoseconds) over the window
+        self.accum_window_len = accum_window_len
+        self.receive_latency = 0
+        self.reset_latency_window()
 
     def print_info(self) -> None:
         """
         Prints basic information about the sensor configuration.
         """
-        self.logger.debug(f"ID: {self.sensor_id}, position: {self.position.name}, sampling period: {self.cs_sampling_period}")
+        self.logger.debug("ID: %s, position: %s, sampling period: %s", self.sensor_id, self.position.name, self.cs_sampling_period)
 
     async def render_put(self, request: Message) -> Message:
         """
@@ -119,17 +178,23 @@ class LdrSensorManager(resource.Resource):
         Returns
         -------
         response: Message
-            Response indicating the request was successfully processed.
+            Response indicating the request was successfully processed, or a
+            4.00 Bad Request if the payload is malformed.
         """
-        decoded_string = request.payload.decode('utf-8')
-        query_params = dict(param.split('=') for param in decoded_string.split('&'))
+        try:
+            # Binary payloads are flagged with the application/octet-stream content format
+            if request.opt.content_format == ContentFormat.OCTETSTREAM:
+                sensor_id, location, data = parse_binary_payload(request.payload)
+            else:
+                sensor_id, location, data = parse_payload(request.payload)
+        except ValueError as e:
+            self.logger.warning("Malformed CoAP payload for LDR%s: %s", self.sensor_id, e)
+            return Message(code=aiocoap.BAD_REQUEST)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("CoAP message received: ID(%s) - position(%s) - value(%d%%)",
+                             sensor_id.decode(errors="replace"), location.decode(errors="replace"), data)
 
-        sensor_id = query_params.get('sensor_id')
-        location = query_params.get('location')
-        data = query_params.get('data')
-        self.logger.info(f"CoAP message received: ID({sensor_id}) - position({location}) - value({data}%)")
-
-        self.store_value(query_params)
+        self.store_value(data)
         response = Message(code=aiocoap.CHANGED, payload=self.put_response_p.encode('utf-8'))
         return response
 
@@ -144,7 +209,7 @@ class LdrSensorManager(resource.Resource):
         await aiocoap.Context.create_server_context(root, bind=(self.coap_cfg['coap_ip'], self.coap_cfg['coap_port']))
         await asyncio.get_running_loop().create_future()
 
-    def update_sensor(self, position: Position, sampling_period: int, plant: Plant) -> None:
+    def update_sensor(self, position: Position, sampling_period: int, accum_window_len: int, plant: Plant) -> bool:
         """
         Updates the sensor configuration dynamically.
 
@@ -154,23 +219,87 @@ class LdrSensorManager(resource.Resource):
             New sensor position.
         sampling_period : int
             New sampling period in seconds.
+        accum_window_len : int
+            New latency accumulation window in minutes.
         plant : Plant
             Updated plant information.
+
+        Returns
+        -------
+        bool
+            True if the configuration changed, False if it was already applied.
         """
+        position = position.update(sensor_id=self.sensor_id)
+        plant = plant.update_plant(sensor_id=self.sensor_id)
+        if (position, plant, sampling_period, accum_window_len) == (self.position, self.plant, self.ns_sampling_period, self.accum_window_len):
+            return False
+
         self.position = position
         self.ns_sampling_period = sampling_period
         self.plant = plant
 
-        self.mqtt_client.update_sensor(position, sampling_period)
+        if sampling_period != self.cs_sampling_period or accum_window_len != self.accum_window_len:
+            # Restart the latency accumulation with the new window size
+            self.cs_sampling_period = sampling_period
+            self.accum_window_len = accum_window_len
+            self.reset_latency_window()
 
-    def store_value(self, content: dict[str, str]) -> None:
+        self.mqtt_client.update_sensor(self.position, sampling_period)
+        return True
+
+    def reset_latency_window(self) -> None:
+        """
+        Restarts the receive latency accumulation, sizing the window from the current
+        sampling period and accumulation window length.
+        """
+        self._window = max(1, int(self.accum_window_len * 60 / self.cs_sampling_period))
+        self._period_ns = self.cs_sampling_period * 1_000_000_000
+        self._lat_idx = 0
+        self._lat_sum = 0
+        self.last_time = None
+
+    def store_value(self, data: int) -> None:
         """
         Stores the received LDR sensor value and timestamp in the database.
 
         Parameters
         ----------
-        content : dict[str, str]
-            Dictionary containing CoAP message parameters.
+        data : int
+            LDR value carried by the CoAP message.
+        """
+        self.coap_ldr_value = data
+        self.influxdb_client.store_value("ldrValue", "ldr", self.sensor_id, self.coap_ldr_value)
+        self.store_timestamp(time.monotonic_ns())
+
+    def store_timestamp(self, timestamp: int) -> None:
+        """
+        Accumulates the receive latency of the current message and stores the mean
+        latency once the accumulation window is full.
+
+        The latency is the delay of a message with respect to the expected arrival
+        time, i.e. the time elapsed since the previous message minus the sampling period.
+
+        Parameters
+        ----------
+        timestamp : int
+            Reception time of the message, read from the monotonic clock (in nanoseconds).
+        """
+        if self.last_time is not None:
+            # Integer nanoseconds: the running sum is exact, no compensation needed
+            self.receive_latency = timestamp - self.last_time - self._period_ns
+            self._lat_sum += self.receive_latency
+            self._lat_idx += 1
+            if self._lat_idx == self._window:
+                self.compute_latency_mean()
+                self._lat_idx = 0
+        self.last_time = timestamp
+
+    def compute_latency_mean(self) -> None:
+        """
+        Computes the mean receive latency over the accumulation window, stores it in the
+        database and resets the running sum.
         """
-        self.coap_ldr_value = content.get('data')
-        self.influxdb_client.store_value("ldrValue", "ldr", self.sensor_id, self.coap_ldr_value)
\ No newline at end of file
+        mean_lat = self._lat_sum / self._window / 1e3
+        self._lat_sum = 0
+        self.logger.debug("Mean latency of LDR%s: %.0f us", self.sensor_id, mean_lat)
+        self.influxdb_client.store_mean_lat_influxdb(mean_lat, self.sensor_id)
\ No newline at end of file
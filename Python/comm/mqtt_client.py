@@ -42,6 +42,8 @@ class MqttClient():
         The position of the sensor.
     sampling_period : int
         The sampling period in seconds for data collection.
+    publish_period : int
+        The period in seconds between two publications of the sensor configuration.
     """
 
     def __init__(self, mqtt_ip: str, mqtt_port: int, mqtt_user: str, mqtt_password: str,
@@ -86,6 +88,11 @@ class MqttClient():
         self.position = position
         self.sampling_period = sampling_period
 
+        self.sampling_period_topic = f"home/ldr{sensor_id}/sampling_period"
+        self.position_topic = f"home/ldr{sensor_id}/position"
+        self.publish_period = 5
+        self._connected = False
+
     def update_sensor(self, position: Position, sampling_period: int):
         """
         Updates the configuration for the sensor, including position and sampling period.
@@ -115,9 +122,15 @@ class MqttClient():
         """
         Establishes the connection to the MQTT broker using the configured settings.
         Starts the MQTT client's loop for managing communication.
+
+        The connection is opened only once: further calls are no-ops until
+        `mqtt_disconnect` is called.
         """
+        if self._connected:
+            return
         self.client.connect(self.mqtt_cfg['ip'], self.mqtt_cfg['port'], self.mqtt_cfg['keep_alive'])
         self.client.loop_start()
+        self._connected = True
 
     def mqtt_disconnect(self) -> None:
         """
@@ -125,6 +138,7 @@ class MqttClient():
         """
         self.client.loop_stop()
         self.client.disconnect()
+        self._connected = False
 
     def mqtt_publish(self, topic: str, payload: None, qos: int = 2) -> None:
         """
@@ -139,31 +153,38 @@ class MqttClient():
         qos : int, optional, default: 2
             The Quality of Service level to use for the message (0, 1, or 2).
         """
-        self.logger.debug(f"Publishing to topic '{topic}' with payload '{payload}' and QoS {qos}")
+        self.logger.debug("Publishing to topic '%s' with payload '%s' and QoS %s", topic, payload, qos)
         self.client.publish(topic, payload, qos=qos)
 
-    async def periodic_publish(self) -> None:
+    async def publish_loop(self, topic: str, get_payload, period: float) -> None:
         """
-        Periodically publishes sensor configuration (position and sampling period) to the MQTT broker.
-        Runs in an asynchronous loop and publishes every 5 seconds.
-
-        This method connects to the MQTT broker, continuously publishes sensor data, 
-        and then disconnects once done.
+        Publishes the value returned by `get_payload` to `topic` every `period` seconds.
+        The publish call runs in the default executor so the event loop never waits on the socket.
 
         Parameters
         ----------
-        sensor_id : str
-            The sensor's unique identifier to be published.
-        sampling_period : int
-            The sampling period of the sensor to be published.
-        position : Position
-            The position of the sensor to be published.
+        topic : str
+            The topic to which the messages are published.
+        get_payload : Callable[[], None]
+            Returns the current payload to publish.
+        period : float
+            Publishing period in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(None, self.mqtt_publish, topic, get_payload())
+            await asyncio.sleep(period)
+
+    async def periodic_publish(self) -> None:
+        """
+        Periodically publishes sensor configuration (position and sampling period) to the MQTT broker.
+        Each topic is published by its own loop, every `publish_period` seconds.
+
+        The connection to the broker is opened once and kept open across restarts of this
+        coroutine; the network traffic is handled by paho's background thread.
         """
         self.mqtt_connect()
-        try:
-            while True:
-                self.mqtt_publish(f"home/ldr{self.sensor_id}/sampling_period", self.sampling_period)
-                self.mqtt_publish(f"home/ldr{self.sensor_id}/position", self.position.name)
-                await asyncio.sleep(5)
-        finally:
-            self.mqtt_disconnect()
+        await asyncio.gather(
+            self.publish_loop(self.sampling_period_topic, lambda: self.sampling_period, self.publish_period),
+            self.publish_loop(self.position_topic, lambda: self.position.name, self.publish_period),
+        )
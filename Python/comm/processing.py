@@ -19,13 +19,18 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from dateutil.easter import easter
+import atexit
+import functools
 import logging
+import os
+import pickle
+import time
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 from sklearn.preprocessing import StandardScaler
 
-from comm import LdrSensorManager
 from comm import DBClient
+from comm.kernels import rolling_outlier_mask
 from tools import *
 
 # Set up logger for processing unit
@@ -39,52 +44,65 @@ class CmdStanpyFilter(logging.Filter):
 
 logging.getLogger("cmdstanpy").addFilter(CmdStanpyFilter())
 
-from datetime import datetime, timedelta
-from dateutil.easter import easter
+# model_predict keeps its DB client open across cycles: flush its batched points when the worker exits
+atexit.register(DBClient.close_shared)
+
+# Number of prediction cycles a fitted model is reused before refitting it on fresh data
+REFIT_CYCLES = 4
+
+# Posterior samples drawn to estimate the prediction interval (Prophet's default is 1000).
+# The interval is only read on a handful of points, so a smaller sample is enough.
+UNCERTAINTY_SAMPLES = 100
+
+# Per sensor: fitted Prophet model, scaler used for its training data, number of cycles it
+# has served and fingerprint of its training data. Reused for predictions between refits,
+# to skip refits on unchanged data and to warm-start the next fit.
+_models: dict[str, tuple[Prophet, StandardScaler, int, tuple]] = {}
+
+# Fitted models are also saved here, so a restart can skip the first fit of every sensor
+MODEL_CACHE_DIR = ".cache"
+
+# Maximum age in seconds of a saved model that is loaded at startup
+MODEL_CACHE_MAX_AGE_S = 3600
+
+# Fixed-date holidays in Italy as (month, day)
+FIXED_HOLIDAYS = [
+    (1, 1),    # New Year's Day
+    (1, 6),    # Epiphany
+    (4, 25),   # Liberation Day
+    (5, 1),    # International Workers' Day
+    (6, 2),    # Republic Day
+    (8, 15),   # Assumption Day
+    (11, 1),   # All Saints' Day
+    (12, 8),   # Immaculate Conception
+    (12, 25),  # Christmas Day
+    (12, 26),  # St. Stephen's Day
+]
 
+@functools.lru_cache(maxsize=8)
 def generate_holidays(start_year: int, end_year: int) -> pd.DataFrame:
     """
     Generates a DataFrame of weekends and public holidays in Italy between the specified years.
+
+    The result is cached per year range, so the same DataFrame is returned to every
+    caller: it must be treated as read-only.
     """
-    # Generate a list of dates for weekends
-    weekends = []
-    for year in range(start_year, end_year + 1):
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year, 12, 31)
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date.weekday() in [5, 6]:  # Saturday (5) and Sunday (6)
-                weekends.append(current_date)  # Ensure datetime.datetime type
-            current_date += timedelta(days=1)
-
-    # Define fixed-date holidays in Italy
-    fixed_holidays = [
-        "01-01",  # New Year's Day
-        "01-06",  # Epiphany
-        "04-25",  # Liberation Day
-        "05-01",  # International Workers' Day
-        "06-02",  # Republic Day
-        "08-15",  # Assumption Day
-        "11-01",  # All Saints' Day
-        "12-08",  # Immaculate Conception
-        "12-25",  # Christmas Day
-        "12-26",  # St. Stephen's Day
-    ]
+    # Generate the dates for weekends: Saturday (5) and Sunday (6)
+    all_days = pd.date_range(datetime(start_year, 1, 1), datetime(end_year, 12, 31), freq='D')
+    weekends = all_days[all_days.dayofweek >= 5].to_pydatetime().tolist()
 
     holidays = []
     for year in range(start_year, end_year + 1):
         # Add fixed-date holidays
-        for holiday in fixed_holidays:
-            holiday_date = datetime.strptime(f"{year}-{holiday}", "%Y-%m-%d")
-            holidays.append(holiday_date)
+        for month, day in FIXED_HOLIDAYS:
+            holidays.append(datetime(year, month, day))
         
         # Add Easter Monday (Pasquetta)
         easter_monday = easter(year) + timedelta(days=1)
         holidays.append(datetime(easter_monday.year, easter_monday.month, easter_monday.day))  # Ensure datetime.datetime type
 
     # Combine weekends and holidays, removing duplicates
-    all_holidays = list(set(weekends + holidays))
-    all_holidays.sort()
+    all_holidays = pd.DatetimeIndex(weekends + holidays).unique().sort_values()
 
     # Create a DataFrame with holidays
     holidays_df = pd.DataFrame({
@@ -94,10 +112,111 @@ def generate_holidays(start_year: int, end_year: int) -> pd.DataFrame:
 
     return holidays_df
 
-    
 
+def data_fingerprint(time_series_df: pd.DataFrame) -> tuple:
+    """
+    Cheap fingerprint of a time series, used to detect when no new data has arrived.
+
+    Parameters
+    ----------
+    time_series_df : pd.DataFrame
+        Time series with columns 'ds' and 'y'.
 
-def model_predict(ldr_sensor: LdrSensorManager, influxdb_cfg: dict[str, str], holidays: pd.DataFrame) -> None:
+    Returns
+    -------
+    tuple
+        Number of rows, last timestamp and last value of the series.
+    """
+    if time_series_df.empty:
+        return (0, None, None)
+    return (len(time_series_df), time_series_df['ds'].iloc[-1], time_series_df['y'].iloc[-1])
+
+
+def save_model(sensor_id: str, model: Prophet, scaler: StandardScaler, fingerprint: tuple) -> None:
+    """
+    Saves a fitted model to the model cache directory, so it survives a restart.
+
+    Parameters
+    ----------
+    sensor_id : str
+        Identifier of the LDR sensor.
+    model : Prophet
+        The fitted model.
+    scaler : StandardScaler
+        Scaler fitted on the training data of the model.
+    fingerprint : tuple
+        Fingerprint of the training data, see `data_fingerprint`.
+    """
+    path = os.path.join(MODEL_CACHE_DIR, f"prophet_{sensor_id}.pkl")
+    try:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump((model, scaler, fingerprint), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.warning("Could not save the model of LDR%s: %s", sensor_id, e)
+
+
+def load_saved_model(sensor_id: str) -> tuple[Prophet, StandardScaler, int, tuple] | None:
+    """
+    Loads the model saved for a sensor, if it is recent enough.
+
+    Parameters
+    ----------
+    sensor_id : str
+        Identifier of the LDR sensor.
+
+    Returns
+    -------
+    tuple[Prophet, StandardScaler, int, tuple] | None
+        An entry for the model cache, or None if there is no usable saved model.
+    """
+    path = os.path.join(MODEL_CACHE_DIR, f"prophet_{sensor_id}.pkl")
+    try:
+        age = time.time() - os.stat(path).st_mtime
+        if age >= MODEL_CACHE_MAX_AGE_S:
+            return None
+        with open(path, 'rb') as f:
+            model, scaler, fingerprint = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Could not load the saved model of LDR%s: %s", sensor_id, e)
+        return None
+
+    logger.debug("Loaded saved model of LDR%s (%.0f s old)", sensor_id, age)
+    return (model, scaler, 1, fingerprint)
+
+
+def warm_start_params(model: Prophet) -> dict[str, None]:
+    """
+    Extracts the fitted parameters of a Prophet model so they can initialize the next fit.
+
+    Parameters
+    ----------
+    model : Prophet
+        A fitted Prophet model.
+
+    Returns
+    -------
+    dict[str, None]
+        Initial values for the `k`, `m`, `sigma_obs`, `delta` and `beta` parameters.
+    """
+    res = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        if model.mcmc_samples == 0:
+            res[pname] = model.params[pname][0][0]
+        else:
+            res[pname] = np.mean(model.params[pname])
+    for pname in ['delta', 'beta']:
+        if model.mcmc_samples == 0:
+            res[pname] = model.params[pname][0]
+        else:
+            res[pname] = np.mean(model.params[pname], axis=0)
+    return res
+
+
+
+def model_predict(sensor_id: str, influxdb_cfg: dict[str, str], holidays: pd.DataFrame) -> None:
     """
     Uses the Prophet model to predict future LDR sensor readings based on the past 24 hours of data.
     
@@ -107,8 +226,9 @@ def model_predict(ldr_sensor: LdrSensorManager, influxdb_cfg: dict[str, str], ho
 
     Parameters
     ----------
-    ldr_sensor : LdrSensorManager
-        The LDR sensor object that holds sensor information such as the sensor ID and sampling period.
+    sensor_id : str
+        Identifier of the LDR sensor. Only plain data is passed so that the function
+        can run in a worker process.
         
     influxdb_cfg : dict[str, str]
         A dictionary containing the configuration for connecting to the InfluxDB instance.
@@ -124,45 +244,76 @@ def model_predict(ldr_sensor: LdrSensorManager, influxdb_cfg: dict[str, str], ho
     Exception
         If any error occurs during the prediction process, it will be caught and logged.
     """
-    scaler = StandardScaler()
+    # Reuse the worker's DB client, so the connection to InfluxDB stays open across cycles
+    db_client = DBClient.get_shared(influxdb_cfg['token'], influxdb_cfg['org'], influxdb_cfg['url'], influxdb_cfg['bucket'])
 
-    # Initialize the DB client with the given configuration
-    db_client = DBClient(influxdb_cfg['token'], influxdb_cfg['org'], influxdb_cfg['url'], influxdb_cfg['bucket'])
+    cached = _models.get(sensor_id)
+    if cached is None:
+        # First cycle of this process: try the model saved by a previous run
+        cached = load_saved_model(sensor_id)
+    if cached is not None and cached[2] < REFIT_CYCLES:
+        # Recent fit available: predict with it and skip loading and training
+        model, scaler, cycles, fingerprint = cached
+        _models[sensor_id] = (model, scaler, cycles + 1, fingerprint)
+    else:
+        # Load the past 24 hours of LDR sensor data from the database
+        time_series_df = db_client.load_timeseries("inf", sensor_id)
+        fingerprint = data_fingerprint(time_series_df)
 
-    # Load the past 24 hours of LDR sensor data from the database
-    time_series_df = db_client.load_timeseries("inf", ldr_sensor.sensor_id)
-    
-    # Preprocess the time series data to remove outliers
-    time_series_preprocess_df = preprocess_timeseries(time_series_df, 1.5)
-    y_values = time_series_preprocess_df['y'].values.reshape(-1, 1)
-    time_series_preprocess_df['y'] = scaler.fit_transform(y_values)
-
-    start_training = datetime.now()
-    # Create and fit the Prophet model on the preprocessed data
-    model = Prophet(interval_width=0.95, daily_seasonality=True, weekly_seasonality=False, yearly_seasonality=False, holidays=holidays)
-    model.fit(time_series_preprocess_df)
-    
-    # Generate predictions for the next period based on the sensor's sampling period
-    # period = int(120 * 60 / ldr_sensor.cs_sampling_period)  # 30 minutes worth of future data
-    # future_points = model.make_future_dataframe(periods=period, freq=f'{ldr_sensor.cs_sampling_period}s')
-    future_points = model.make_future_dataframe(periods=4, freq=f'{influxdb_cfg['prediction_period_min']}min')
+        if cached is not None and cached[3] == fingerprint:
+            # No new data since the last fit: a refit would train on the same series
+            logger.debug("No new data for LDR%s, skipping refit", sensor_id)
+            model, scaler = cached[0], cached[1]
+            _models[sensor_id] = (model, scaler, 1, fingerprint)
+        else:
+            scaler = StandardScaler()
+
+            # Preprocess the time series data to remove outliers
+            time_series_preprocess_df = preprocess_timeseries(time_series_df, 1.5)
+            # Prophet and the scaler work in double precision
+            y_values = time_series_preprocess_df['y'].to_numpy(dtype=np.float64).reshape(-1, 1)
+            time_series_preprocess_df['y'] = scaler.fit_transform(y_values)
+
+            # Create and fit the Prophet model on the preprocessed data
+            model = Prophet(interval_width=0.95, daily_seasonality=True, weekly_seasonality=False, yearly_seasonality=False, holidays=holidays,
+                            uncertainty_samples=UNCERTAINTY_SAMPLES)
+            if cached is None:
+                model.fit(time_series_preprocess_df)
+            else:
+                # Start the optimization from the previous fit: the series only gained a few samples
+                try:
+                    model.fit(time_series_preprocess_df, init=warm_start_params(cached[0]))
+                except Exception as e:
+                    # Parameter shapes changed (e.g. new changepoints or holidays): fit from scratch
+                    logger.debug("Warm start failed for LDR%s: %s", sensor_id, e)
+                    model = Prophet(interval_width=0.95, daily_seasonality=True, weekly_seasonality=False, yearly_seasonality=False, holidays=holidays,
+                                    uncertainty_samples=UNCERTAINTY_SAMPLES)
+                    model.fit(time_series_preprocess_df)
+            _models[sensor_id] = (model, scaler, 1, fingerprint)
+            save_model(sensor_id, model, scaler, fingerprint)
+
+    # Generate predictions for the next periods, starting from now since a reused model
+    # may have been trained a few cycles ago
+    # period = int(120 * 60 / sampling_period)  # 30 minutes worth of future data
+    # future_points = model.make_future_dataframe(periods=period, freq=f'{sampling_period}s')
+    now = pd.Timestamp(datetime.now())
+    freq = f"{influxdb_cfg['prediction_period_min']}min"
+    future_points = pd.DataFrame({'ds': pd.date_range(start=now, periods=5, freq=freq)[1:]})
     
     # Get the predicted values for the future points
     pred_df = model.predict(future_points)
     pred_df['yhat'] = scaler.inverse_transform(pred_df[['yhat']])
     pred_df['yhat_lower'] = scaler.inverse_transform(pred_df[['yhat_lower']])
     pred_df['yhat_upper'] = scaler.inverse_transform(pred_df[['yhat_upper']])
-    future_val = pred_df[pred_df['ds'] >= datetime.now()]  # Filter future values after current time
-    logger.debug(f"Predicted {future_val['yhat'].shape[0]} future points")
+    logger.debug("Predicted %d future points", pred_df.shape[0])
 
     # Log the predictions for the sensor
-    logger.info(f"Predicted: lower({future_val['yhat_lower'].values[0]:.2f}), pred({future_val['yhat'].values[0]:.2f}), upper({future_val['yhat_upper'].values[0]:.2f})")
-    list(map(lambda x: logger.debug(f"{x: .2f}"), future_val['yhat'].values))
-    list(map(lambda x: logger.debug(f"{x}"), future_val['ds'].values))
+    logger.info("Predicted: lower(%.2f), pred(%.2f), upper(%.2f)",
+                pred_df['yhat_lower'].values[0], pred_df['yhat'].values[0], pred_df['yhat_upper'].values[0])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("yhat=%s ds=%s", pred_df['yhat'].values, pred_df['ds'].values)
     # Store the predictions back in the database
-    db_client.store_predictions(future_val, ldr_sensor.sensor_id)
-    db_client.store_predictions_lower(future_val, ldr_sensor.sensor_id)
-    db_client.store_predictions_upper(future_val, ldr_sensor.sensor_id)
+    db_client.store_prediction_bundle(pred_df, sensor_id)
 
 
 def preprocess_timeseries(time_series_df: pd.DataFrame, std_threshold: float, window_size: str = "1h") -> pd.DataFrame:
@@ -195,43 +346,17 @@ def preprocess_timeseries(time_series_df: pd.DataFrame, std_threshold: float, wi
     This function uses the rolling mean and standard deviation to identify and remove outliers.
     The function assumes that the 'ds' column contains datetime values and the 'y' column contains the sensor data.
     """
-    # Make a copy of the time series data to avoid modifying the original data
-    time_series_copy_df = time_series_df.copy()
-    
-    # Set the 'ds' column as the index
-    time_series_copy_df.set_index('ds', inplace=True)
-    
-    # Calculate rolling mean and standard deviation over the specified window size
-    rolling_window = time_series_copy_df.rolling(window_size)
-    mean_series = rolling_window.mean()
-    std_series = rolling_window.std()
-    
-    # List of indices to be removed (outliers)
-    remove_idx = []
-    
-    # Check each data point for being an outlier
-    for idx, val in time_series_copy_df['y'].items():
-        mean = mean_series.get(idx, None)
-        std = std_series.get(idx, None)
-        
-        # If the mean or std is not available for a point, skip it
-        if mean is None or std is None:
-            continue
-
-        # Calculate the threshold for outlier detection
-        threshold = std_threshold * std
-        if abs(val - mean) > threshold:
-            remove_idx.append(idx)
-    
-    # Drop the outliers from the time series data
-    time_series_processed_df = time_series_copy_df.drop(remove_idx)
-    
-    # Reset index and return the cleaned DataFrame
-    time_series_copy_df.reset_index(inplace=True)
-    time_series_processed_df.reset_index(inplace=True)
+    # Work on the raw arrays: no copy of the DataFrame and no index round-trip
+    ds = time_series_df['ds'].to_numpy(dtype='datetime64[ns]')
+    # LDR readings are small integers: float32 holds them exactly and halves the buffer
+    y = pd.to_numeric(time_series_df['y'], errors='coerce', downcast='float').to_numpy(dtype=np.float32)
 
-    time_series_processed_df['y'] = pd.to_numeric(time_series_processed_df['y'], errors='coerce')
-    time_series_processed_df.dropna(subset=['y'], inplace=True)
+    # Drop the non-numeric readings before the outlier detection
+    valid = ~np.isnan(y)
+    ds, y = ds[valid], y[valid]
 
-    return time_series_processed_df
+    # Flag the outliers against the rolling mean and std in a single pass over the readings
+    keep = rolling_outlier_mask(ds.view(np.int64), y, pd.Timedelta(window_size).value, std_threshold)
 
+    # Drop the outliers from the time series data
+    return pd.DataFrame({'ds': ds[keep], 'y': y[keep]})
@@ -5,13 +5,16 @@ License: Apache License, Version 2.0
 """
 
 import asyncio
-import json
 import logging
-from datetime import datetime, time
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
 from comm import LdrSensorManager, model_predict, generate_holidays
+from comm.kernels import warm_up
 from sensorInfo import *
 from tools import *
 
@@ -41,8 +44,7 @@ async def load_default_config() -> dict:
         Dictionary containing the default configurations.
     """
     logger.debug("Loading default configurations")
-    with open(r'.\default_config.json', 'r') as f:
-        return json.load(f)
+    return await load_json_config_async(r'.\default_config.json')
     
 async def load_sensors_config() -> dict:
     """
@@ -54,8 +56,7 @@ async def load_sensors_config() -> dict:
         Dictionary containing the sensor configurations.
     """
     logger.debug("Loading sensors configurations")
-    with open(r'.\sensors_config.json', 'r') as f:
-        return json.load(f)
+    return await load_json_config_async(r'.\sensors_config.json')
     
 async def load_sensors():
     """
@@ -64,8 +65,8 @@ async def load_sensors():
     logger.debug("Loading sensors")
     global ldr_sensors
     
-    default_config = await load_default_config()
-    sensors_config = await load_sensors_config()
+    # Read both files concurrently
+    default_config, sensors_config = await asyncio.gather(load_default_config(), load_sensors_config())
     
     # Initialize sensors
     new_sensors = await setup_sensors(default_config, sensors_config)
@@ -115,11 +116,12 @@ async def update_holidays():
     global current_holidays
 
     while True:
-        # Update holidays once every day at midnight
-        if datetime.now().time() == time(0, 0):
-            current_holidays = generate_holidays(datetime.now().year, datetime.now().date().year + 1)
-            logger.critical("Updating holidays")
-        await asyncio.sleep(30)
+        # Sleep until the next midnight, then update holidays
+        now = datetime.now()
+        next_midnight = datetime.combine(now.date() + timedelta(days=1), time(0, 0))
+        await asyncio.sleep((next_midnight - now).total_seconds())
+        current_holidays = generate_holidays(datetime.now().year, datetime.now().date().year + 1)
+        logger.critical("Updating holidays")
 
 async def reload_sensors():
     """
@@ -129,22 +131,24 @@ async def reload_sensors():
     global ldr_sensors
     
     try:
-        # Load updated configurations
-        default_config = await load_default_config()
-        sensors_config = await load_sensors_config()
+        # Load updated configurations, reading both files concurrently
+        default_config, sensors_config = await asyncio.gather(load_default_config(), load_sensors_config())
         
+        # Index the current sensors once instead of scanning the list for every configuration
+        sensors_by_id = {ldr.sensor_id: ldr for ldr in ldr_sensors}
+
         for sensor_cfg in sensors_config['sensors']:
             sensor_id = sensor_cfg['id']
-            existing_sensor = next((ldr for ldr in ldr_sensors if ldr.sensor_id == sensor_id), None)
+            existing_sensor = sensors_by_id.get(sensor_id)
             
             if existing_sensor:
                 # Update the existing sensor
-                existing_sensor.update_sensor(Position(**sensor_cfg['position']), 
-                                              sensor_cfg['sampling_period'], 
-                                              sensor_cfg['accumulation_window'], 
-                                              Plant(**sensor_cfg['plant']))
-                logger.debug(f"Updated sensor {sensor_id} with new config.")
-                existing_sensor.print_info()
+                if existing_sensor.update_sensor(Position(**sensor_cfg['position']), 
+                                                 sensor_cfg['sampling_period'], 
+                                                 sensor_cfg['accumulation_window'], 
+                                                 Plant(**sensor_cfg['plant'])):
+                    logger.debug(f"Updated sensor {sensor_id} with new config.")
+                    existing_sensor.print_info()
             else:
                 # Add a new sensor if it doesn't exist
                 coap_cfg = {"coap_ip": default_config['coap']['ip'], "coap_port": sensor_cfg["coap_port"]}
@@ -154,8 +158,10 @@ async def reload_sensors():
                 new_sensor = LdrSensorManager(coap_cfg, mqtt_cfg, influxdb_cfg, 
                                               sensor_id, Position(**sensor_cfg['position']), 
                                               Plant(**sensor_cfg['plant']), 
-                                              sensor_cfg['sampling_period'])
+                                              sensor_cfg['sampling_period'],
+                                              sensor_cfg['accumulation_window'])
                 ldr_sensors.append(new_sensor)
+                sensors_by_id[sensor_id] = new_sensor
                 logger.debug(f"Added new sensor {sensor_id}.")
     finally:
         logger.debug("Sensor configuration reloaded.")
@@ -195,19 +201,42 @@ async def main():
     asyncio.create_task(update_holidays())
 
     welcome_message()
-    
-    while True:
-        while current_holidays is None:
-            await asyncio.sleep(1)  # wait for holidays to be initialized
 
-        # Perform in parallel prediction for each sensor
-        await asyncio.gather(*[asyncio.to_thread(model_predict, ldr_sensor, influxdb_cfg, current_holidays) for ldr_sensor in ldr_sensors],
-                             )
-        
-        # Reload sensor configurations to reflect updates
-        await reload_sensors()
-        # Pause for 30min between cycles
-        await asyncio.sleep(influxdb_cfg['prediction_period_min'] * 60)
+    # Prophet fits are CPU bound: run them in at most one worker process per CPU. Each sensor
+    # is bound to a fixed worker, which keeps the sensor's fitted model cached in the same
+    # process from one cycle to the next. The JIT kernels are warmed up as each worker starts
+    loop = asyncio.get_running_loop()
+    spawn_context = multiprocessing.get_context("spawn")
+    max_workers = os.cpu_count() or 1
+    process_pools: list[ProcessPoolExecutor] = []
+    worker_index: dict[str, int] = {}
+
+    try:
+        while True:
+            while current_holidays is None:
+                await asyncio.sleep(1)  # wait for holidays to be initialized
+
+            # Sensors added by a reload get a worker of their own until there is one per CPU,
+            # then they are spread over the existing workers in turn
+            for ldr_sensor in ldr_sensors:
+                if ldr_sensor.sensor_id not in worker_index:
+                    if len(process_pools) < max_workers:
+                        process_pools.append(ProcessPoolExecutor(max_workers=1, mp_context=spawn_context,
+                                                                 initializer=warm_up))
+                    worker_index[ldr_sensor.sensor_id] = len(worker_index) % len(process_pools)
+
+            # Perform in parallel prediction for each sensor
+            await asyncio.gather(*[loop.run_in_executor(process_pools[worker_index[ldr_sensor.sensor_id]], model_predict,
+                                                        ldr_sensor.sensor_id, influxdb_cfg, current_holidays)
+                                   for ldr_sensor in ldr_sensors])
+
+            # Reload sensor configurations to reflect updates
+            await reload_sensors()
+            # Pause for 30min between cycles
+            await asyncio.sleep(influxdb_cfg['prediction_period_min'] * 60)
+    finally:
+        for process_pool in process_pools:
+            process_pool.shutdown(cancel_futures=True)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -15,7 +15,6 @@ limitations under the License.
 """
 
 import asyncio
-import json
 import logging
 from watchdog.observers import Observer
 import sys
@@ -42,6 +41,10 @@ LIGHT_GRAY = "\033[37m"
 BOLD = "\033[1m"
 ITALIC = "\033[3m"
 
+# Bound CoAP server and MQTT publishing methods of the sensors, kept in sync with `ldr_sensors`
+coap_servers = []
+mqtt_publishers = []
+
 async def load_default_config() -> dict:
     """
     Load the default configuration settings from a JSON file.
@@ -52,8 +55,7 @@ async def load_default_config() -> dict:
         Dictionary containing the default configuration settings.
     """
     logger.debug("Loading default configurations")
-    with open('default_config.json', 'r') as f:
-        return json.load(f)
+    return await load_json_config_async('default_config.json')
 
 async def load_sensors_config() -> dict:
     """
@@ -65,8 +67,7 @@ async def load_sensors_config() -> dict:
         Dictionary containing the sensor configuration settings.
     """
     logger.debug("Loading sensors configurations")
-    with open('sensors_config.json', 'r') as f:
-        return json.load(f)
+    return await load_json_config_async('sensors_config.json')
 
 async def setup_sensors(default_config: dict, sensors_config: dict) -> list:
     """
@@ -108,7 +109,8 @@ async def setup_sensors(default_config: dict, sensors_config: dict) -> list:
                                       sensor_id, 
                                       position, 
                                       plant, 
-                                      sampling_period)
+                                      sampling_period,
+                                      accum_window)
         ldr_sensor.print_info()
         ldr_sensors.append(ldr_sensor)
     
@@ -122,14 +124,17 @@ async def load_sensors():
     
     global ldr_sensors
     
-    # Load configurations
-    default_config = await load_default_config()
-    sensors_config = await load_sensors_config()
+    # Load configurations, reading both files concurrently
+    default_config, sensors_config = await asyncio.gather(load_default_config(), load_sensors_config())
     
     # Setup sensors based on the loaded configurations
     new_sensors = await setup_sensors(default_config, sensors_config)
     ldr_sensors = new_sensors
 
+    # Cache the bound service methods used by the main loop
+    coap_servers[:] = [ldr.coap_server for ldr in ldr_sensors]
+    mqtt_publishers[:] = [ldr.mqtt_client.periodic_publish for ldr in ldr_sensors]
+
 async def reload_sensors():
     """
     Reload sensor configurations, updating existing sensors or adding new ones.
@@ -139,23 +144,26 @@ async def reload_sensors():
     global ldr_sensors
     
     try:
-        # Reload configurations
-        default_config = await load_default_config()
-        sensors_config = await load_sensors_config()
+        # Reload configurations, reading both files concurrently
+        default_config, sensors_config = await asyncio.gather(load_default_config(), load_sensors_config())
         
+        # Index the current sensors once instead of scanning the list for every configuration
+        sensors_by_id = {ldr.sensor_id: ldr for ldr in ldr_sensors}
+
         for sensor_cfg in sensors_config['sensors']:
             sensor_id = sensor_cfg['id']
             
             # Check if the sensor already exists in the current list
-            existing_sensor: LdrSensorManager = next((ldr for ldr in ldr_sensors if ldr.sensor_id == sensor_id), None)
+            existing_sensor: LdrSensorManager = sensors_by_id.get(sensor_id)
                 
             if existing_sensor:
                 # Update the existing sensor's configuration
-                existing_sensor.update_sensor(Position(**sensor_cfg['position']), 
-                                              sensor_cfg['sampling_period'],
-                                              Plant(**sensor_cfg['plant']))
-                logger.debug(f"Updated sensor {sensor_id} with new config.")
-                existing_sensor.print_info()
+                if existing_sensor.update_sensor(Position(**sensor_cfg['position']), 
+                                                 sensor_cfg['sampling_period'],
+                                                 sensor_cfg['accumulation_window'],
+                                                 Plant(**sensor_cfg['plant'])):
+                    logger.debug(f"Updated sensor {sensor_id} with new config.")
+                    existing_sensor.print_info()
             else:
                 # Add a new sensor if not already present
                 coap_cfg = {"coap_ip": default_config['coap']['ip'], "coap_port": sensor_cfg["coap_port"]}
@@ -168,9 +176,13 @@ async def reload_sensors():
                                               sensor_id, 
                                               Position(**sensor_cfg['position']), 
                                               Plant(**sensor_cfg['plant']), 
-                                              sensor_cfg['sampling_period']
+                                              sensor_cfg['sampling_period'],
+                                              sensor_cfg['accumulation_window']
                                               )
                 ldr_sensors.append(new_sensor)
+                sensors_by_id[sensor_id] = new_sensor
+                coap_servers.append(new_sensor.coap_server)
+                mqtt_publishers.append(new_sensor.mqtt_client.periodic_publish)
                 logger.debug(f"Added new sensor {sensor_id}.")
     finally:
         logger.debug("Final configuration state.")
@@ -212,18 +224,25 @@ async def main() -> None:
     observer.start()
     
     # Main loop to handle CoAP and MQTT functionality
-    while True:
-        try:
-            await asyncio.gather(
-                *[ldr.coap_server() for ldr in ldr_sensors],  # Start CoAP servers
-                *[ldr.mqtt_client.periodic_publish() for ldr in ldr_sensors],  # Start periodic MQTT publishing
-                reload_sensors()  # Periodically reload configurations
-            )
-        except Exception as e:
-            logger.error(f"Error occurred: {e}")
-        finally:
-            observer.stop()
-            observer.join()
+    try:
+        while True:
+            try:
+                await asyncio.gather(
+                    *[coap_server() for coap_server in coap_servers],  # Start CoAP servers
+                    *[periodic_publish() for periodic_publish in mqtt_publishers],  # Start periodic MQTT publishing
+                    reload_sensors()  # Periodically reload configurations
+                )
+            except Exception as e:
+                logger.error(f"Error occurred: {e}")
+            finally:
+                observer.stop()
+                observer.join()
+    finally:
+        # Close the MQTT sessions cleanly, so QoS 2 publishes still in flight are completed
+        for ldr in ldr_sensors:
+            ldr.mqtt_client.mqtt_disconnect()
+        # Flush the points still batched in the shared DB clients
+        DBClient.close_shared()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -14,17 +14,19 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Plant():
     """
     A dataclass representing a plant.
 
     This class holds information about the plant's type, the amount of sunlight it 
     needs (in hours), and the associated sensor ID for monitoring purposes.
+    Plants are immutable and hashable, so configurations can be compared and used
+    as dict keys: an update returns a new plant.
 
     Attributes
     ----------
@@ -38,7 +40,7 @@ class Plant():
     Methods
     -------
     update_plant(type=None, light_amount=None, sensor_id=None)
-        Updates the plant's attributes with the new values provided.
+        Returns a copy of the plant with the new values provided.
     """
 
     type: str
@@ -50,11 +52,11 @@ class Plant():
     sensor_id: str
     """The unique identifier for the sensor associated with this plant"""
 
-    def update_plant(self, type: str = None, light_amount: int = None, sensor_id: str = None) -> None:
+    def update_plant(self, type: str = None, light_amount: int = None, sensor_id: str = None) -> "Plant":
         """
-        Update the plant settings with new values.
+        Return a copy of the plant with its settings updated with new values.
 
-        This method allows for updating one or more attributes of the plant object.
+        This method allows for changing one or more attributes of the plant object.
         If any of the parameters are provided (i.e., not None), they will update the 
         corresponding attributes of the plant.
 
@@ -69,12 +71,14 @@ class Plant():
 
         Returns
         -------
-        None
-            This method updates the plant attributes in place and does not return any value.
+        Plant
+            The updated plant. The original plant is left unchanged.
         """
-        if type:
-            self.type = type
-        if light_amount:
-            self.light_amount = light_amount
-        if sensor_id:
-            self.sensor_id = sensor_id
+        changes = {}
+        if type is not None:
+            changes['type'] = type
+        if light_amount is not None:
+            changes['light_amount'] = light_amount
+        if sensor_id is not None:
+            changes['sensor_id'] = sensor_id
+        return replace(self, **changes)
@@ -15,19 +15,22 @@ limitations under the License.
 """
 
 import logging
-from dataclasses import dataclass, field
+from typing import NamedTuple
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
-@dataclass
-class Position():
+# Logger shared by all positions
+logger = logging.getLogger('Position')
+logger.setLevel(logging.INFO)
+
+class Position(NamedTuple):
     """
     Sensor position manager.
     
-    This class represents the position of a sensor in a system, allowing for the 
-    management and update of position details (ID, name, description) and the 
-    association with a sensor. It includes functionality for logging and updating 
-    position details.
+    This class represents the position of a sensor in a system, holding the position
+    details (ID, name, description) and the association with a sensor. Positions are
+    immutable and hashable, so configurations can be compared and used as dict keys:
+    an update returns a new position.
 
     Attributes
     ----------
@@ -39,13 +42,11 @@ class Position():
         A description providing more context about the position.
     sensor_id : str, optional
         The identifier of the sensor associated with this position. Default is an empty string.
-    logger : logging.Logger
-        Logger used for logging position information and updates.
     
     Methods
     -------
     update(position_id=None, name=None, description=None, sensor_id=None)
-        Updates the position details with new values. Only non-None values will be updated.
+        Returns a copy of the position with the given details replaced. Only non-None values are replaced.
     print_position()
         Logs the current position details (ID and name).
     """
@@ -54,22 +55,12 @@ class Position():
     name: str          # Name of the position (e.g., "Living Room", "Kitchen")
     description: str   # A description of the position
     sensor_id: str = ""  # Optional sensor ID associated with this position
-    logger: logging.Logger = field(init=False, default=logging.getLogger('Position'))
-    
-    def __post_init__(self):
-        """
-        Initializes the logger for the Position class.
         
-        This function is automatically called after the object is initialized
-        by the dataclass. It sets the logger level to INFO.
+    def update(self, position_id: str = None, name: str = None, description: str = None, sensor_id: str = None) -> "Position":
         """
-        self.logger.setLevel(logging.INFO)
+        Return a copy of the position with the details updated with new values if provided.
         
-    def update(self, position_id: str = None, name: str = None, description: str = None, sensor_id: str = None) -> None:
-        """
-        Update the position details with new values if provided.
-        
-        This method allows you to modify any of the position's attributes
+        This method allows you to change any of the position's attributes
         (position_id, name, description, sensor_id) by passing in new values.
         Only the attributes with non-None values will be updated.
         
@@ -86,17 +77,19 @@ class Position():
         
         Returns
         ------
-        None
-            This method does not return anything. It updates the position's attributes in place.
+        Position
+            The updated position. The original position is left unchanged.
         """
-        if position_id:
-            self.position_id = position_id
-        if name:
-            self.name = name
-        if description:
-            self.description = description
-        if sensor_id:
-            self.sensor_id = sensor_id
+        changes = {}
+        if position_id is not None:
+            changes['position_id'] = position_id
+        if name is not None:
+            changes['name'] = name
+        if description is not None:
+            changes['description'] = description
+        if sensor_id is not None:
+            changes['sensor_id'] = sensor_id
+        return self._replace(**changes)
         
     def print_position(self):
         """
@@ -110,4 +103,4 @@ class Position():
         None
             This method does not return anything. It only logs the position details.
         """
-        self.logger.info(f"position:{self.position_id}:{self.name}")
+        logger.info("position:%s:%s", self.position_id, self.name)
@@ -14,20 +14,31 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
 from .color_format import ColorFormatter
 from .config_file_handler import ConfigFileHandler
+from .config_cache import load_json_config, load_json_config_async
 
-__all__ = ['ConfigFileHandler', 'ColorFormatter']
+__all__ = ['ConfigFileHandler', 'ColorFormatter', 'load_json_config', 'load_json_config_async']
 
 console_handler = logging.StreamHandler()
 
-formatter = ColorFormatter("%(asctime)s - %(name)s : %(message)s", datefmt="%H:%M:%S")
+formatter = ColorFormatter(datefmt="%H:%M:%S")
 console_handler.setFormatter(formatter)
 
+# Loggers only enqueue their records: the console is written by a background thread
+log_queue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.INFO)
-root_logger.addHandler(console_handler)
\ No newline at end of file
+root_logger.addHandler(queue_handler)
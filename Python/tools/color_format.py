@@ -14,25 +14,62 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from colorama import Fore, Style, init
+import functools
 import logging
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
-# Initialize colorama to automatically reset colors after each log message.
-init(autoreset=True)
+# POSIX terminals render ANSI codes natively: colorama is only needed to translate them on Windows
+if sys.platform == 'win32':
+    from colorama import init
+    init(autoreset=True)
+
+# ANSI color codes, interned since they prefix and suffix every log line
+_CYAN = sys.intern("\x1b[36m")
+_GREEN = sys.intern("\x1b[32m")
+_YELLOW = sys.intern("\x1b[33m")
+_RED = sys.intern("\x1b[31m")
+_MAGENTA = sys.intern("\x1b[35m")
+_WHITE = sys.intern("\x1b[37m")
+_RESET = sys.intern("\x1b[0m")
+
+# Mapping of log levels to colors, built once at import
+_LOG_COLORS = {
+    logging.DEBUG: _CYAN,        # DEBUG messages in Cyan
+    logging.INFO: _GREEN,        # INFO messages in Green
+    logging.WARNING: _YELLOW,    # WARNING messages in Yellow
+    logging.ERROR: _RED,         # ERROR messages in Red
+    logging.CRITICAL: _MAGENTA,  # CRITICAL messages in Magenta
+}
+
+@functools.lru_cache(maxsize=8)
+def _color_for(levelno: int) -> str:
+    """
+    Resolve the color of a log level, white for the levels without a color.
+    """
+    return _LOG_COLORS.get(levelno, _WHITE)
 
 class ColorFormatter(logging.Formatter):
     """
     Custom logging formatter that adds color to log messages based on their severity.
     
-    This formatter uses colorama to format log messages with different colors for
+    This formatter uses ANSI escape codes to format log messages with different colors for
     each logging level: DEBUG, INFO, WARNING, ERROR, and CRITICAL.
+
+    Records are laid out as "<asctime> - <name> : <message>" by a fixed f-string, so
+    the `fmt` argument of `logging.Formatter` is not used.
     """
 
-    def format(self, record):
+    def usesTime(self):
         """
-        Format the log record with color based on the log level.
+        The fixed layout always includes the time, so `asctime` is always computed.
+        """
+        return True
+
+    def formatMessage(self, record):
+        """
+        Lay out a record whose `asctime` and `message` are already computed, in the
+        color of its log level. The record itself is left untouched for other handlers.
 
         Parameters
         ----------
@@ -42,23 +79,7 @@ class ColorFormatter(logging.Formatter):
         Returns
         -------
         str
-            The formatted log message with the appropriate color.
+            The formatted log line with the appropriate color.
         """
-        
-        # Dictionary mapping log levels to colors
-        log_colors = {
-            logging.DEBUG: Fore.CYAN,      # DEBUG messages in Cyan
-            logging.INFO: Fore.GREEN,      # INFO messages in Green
-            logging.WARNING: Fore.YELLOW,  # WARNING messages in Yellow
-            logging.ERROR: Fore.RED,       # ERROR messages in Red
-            logging.CRITICAL: Fore.MAGENTA, # CRITICAL messages in Magenta
-        }
-
-        # Get the color for the current log level, default to white if unknown
-        level_color = log_colors.get(record.levelno, Fore.WHITE)
-
-        # Format the log message with the selected color and reset the color after
-        record.msg = f"{level_color}{record.msg}{Style.RESET_ALL}"
-
-        # Use the default formatter to format the rest of the log record
-        return super().format(record)
+        # Color prefix, layout and reset suffix are joined in a single string build
+        return f"{_color_for(record.levelno)}{record.asctime} - {record.name} : {record.message}{_RESET}"
@@ -0,0 +1,71 @@
+"""
+Copyright 2024 Lorenzo Grandi
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
+
+# orjson is optional: without it the files are parsed with the standard json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Per path: modification time of the file when it was parsed, and the parsed content
+_config_cache: dict[str, tuple[int, dict]] = {}
+
+def load_json_config(path: str) -> dict:
+    """
+    Load a JSON configuration file, parsing it again only if it changed since the last load.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file.
+
+    Returns
+    -------
+    dict
+        The parsed configuration. The same object is returned until the file changes,
+        so it must be treated as read-only.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _config_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        config = json_loads(f.read())
+    _config_cache[path] = (mtime, config)
+    return config
+
+async def load_json_config_async(path: str) -> dict:
+    """
+    Load a JSON configuration file like `load_json_config`, doing the file system access
+    in a worker thread so that the event loop is not blocked.
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file.
+
+    Returns
+    -------
+    dict
+        The parsed configuration, to be treated as read-only.
+    """
+    return await asyncio.to_thread(load_json_config, path)
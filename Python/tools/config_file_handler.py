@@ -16,7 +16,7 @@ limitations under the License.
 
 import logging 
 import asyncio
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import PatternMatchingEventHandler
 import sys
 sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 
@@ -24,33 +24,63 @@ sys.path.append(r'C:\Users\loryg\OneDrive\Desktop\IoT\IoT-LDR\Python')
 logger = logging.getLogger("ConfigFileHandler")
 logger.setLevel(logging.DEBUG)
 
-class ConfigFileHandler(FileSystemEventHandler):
+class ConfigFileHandler(PatternMatchingEventHandler):
     """
     Custom file system event handler that listens for modifications to a configuration file (config.json)
     and triggers a callback function.
     """
 
-    def __init__(self, loop, on_modified_callback):
+    def __init__(self, loop, on_modified_callback, debounce=0.1):
         """
         Initializes the event handler.
         
         Parameters:
         loop (asyncio.AbstractEventLoop): The asyncio event loop where the callback will be executed.
         on_modified_callback (coroutine): The callback function to be called when the file is modified.
+        debounce (float): Seconds without further modifications to wait before calling the callback.
         """
+        # Let watchdog discard the events of directories and of unrelated files
+        super().__init__(patterns=['*config.json'], ignore_directories=True)
         self.loop = loop
         self.on_modified_callback = on_modified_callback
+        self._debounce = debounce
+        self._deadline = 0.0
+        self._pending: asyncio.TimerHandle | None = None
+        self._task: asyncio.Task | None = None
+        # Bound once, so that a burst of events does not allocate a new method object per event
+        self._arm_cb = self._arm
+        self._fire_cb = self._fire
 
     def on_modified(self, event):
         """
         This method is called when a file modification is detected.
         
-        If the modified file is config.json, it logs the event and triggers the callback function.
+        Only events for the config.json files reach this method. It (re)starts the debounce timer, so that a burst
+        of events for a single save triggers the callback only once.
         
         Parameters:
         event (watchdog.events.FileSystemEvent): The event object containing details about the file change.
         """
-        if event.src_path.endswith('config.json'):
-            logger.info("New JSON configurations detected.")
-            # Run the callback asynchronously on the event loop
-            asyncio.run_coroutine_threadsafe(self.on_modified_callback(), self.loop)
+        # Timers belong to the event loop: arm it from the loop's thread
+        self.loop.call_soon_threadsafe(self._arm_cb)
+
+    def _arm(self):
+        """
+        Pushes back the debounce deadline, starting the timer if it is not running. Runs on the event loop.
+        """
+        self._deadline = self.loop.time() + self._debounce
+        if self._pending is None:
+            self._pending = self.loop.call_at(self._deadline, self._fire_cb)
+
+    def _fire(self):
+        """
+        Runs the callback once the modifications have settled. Runs on the event loop.
+        """
+        if self.loop.time() < self._deadline:
+            # More events arrived while the timer was running: wait for the new deadline
+            self._pending = self.loop.call_at(self._deadline, self._fire_cb)
+            return
+        self._pending = None
+        logger.info("New JSON configurations detected.")
+        # Keep a reference to the task, the event loop only holds a weak one
+        self._task = self.loop.create_task(self.on_modified_callback())